@@ -1,13 +1,14 @@
-import pandas as pd
+import numpy as np
 import ast
 
-from part1.eda.verify_polyline_bounds import validate_single_polyline
-
+from part1.data_loading import load_raw
+from part1.eda.verify_polyline_bounds import (
+    count_polyline_points,
+    validate_polylines,
+)
 
-raw_file = "dataset/porto/porto.csv"
-clean_file = "dataset/porto/porto_cleaned.csv"
 
-df = pd.read_csv(raw_file, nrows=100_000)
+clean_file = "dataset/porto/porto_cleaned.parquet"
 
 
 def handle_duplicates(df):
@@ -15,53 +16,73 @@ def handle_duplicates(df):
     Handle duplicate TRIP_IDs by:
     1. Remove the identical duplicate rows with identical TRIP_IDs
     2. Keep different rows with the same TRIP_ID but give them unique IDs
+
+    Only the metadata columns are deduplicated and renumbered, the large
+    POLYLINE strings are reattached for the kept rows at the end.
     """
     # Remove identical duplicate rows
-    columns_to_check = [col for col in df.columns if col != "POLYLINE"]
-    df = df.drop_duplicates(subset=columns_to_check, keep="first")
+    meta = df.drop(columns="POLYLINE").drop_duplicates(keep="first")
 
-    # Handle different rows with the same TRIP_ID
-    df["TRIP_ID_count"] = df.groupby("TRIP_ID").size()
-    duplicate_trip_ids = df[df["TRIP_ID_count"] > 1].index
+    # Handle different rows with the same TRIP_ID by offsetting every repeat
+    # occurrence, so the n-th repeat gets TRIP_ID + n * 10000000000000
+    duplicated = meta["TRIP_ID"].duplicated(keep=False).to_numpy()
+    if duplicated.any():
+        trip_ids = meta["TRIP_ID"].to_numpy(copy=True)
+        occurrence = meta.loc[duplicated].groupby("TRIP_ID", sort=False).cumcount()
+        trip_ids[duplicated] += occurrence.to_numpy() * 10_000_000_000_000
+        meta["TRIP_ID"] = trip_ids
 
-    for trip_id in duplicate_trip_ids:
-        mask = df["TRIP_ID"] == trip_id
-        duplicate_rows = df[mask]
+    meta["POLYLINE"] = df["POLYLINE"]
 
-        for i, (index, row) in enumerate(duplicate_rows.iterrows()):
-            if i > 0:  # Skip the first occurrence
-                new_trip_id = f"{row['TRIP_ID'] + 10000000000000}"
-                df.loc[index, "TRIP_ID"] = new_trip_id
+    return meta[df.columns]
 
-    df = df.drop("TRIP_ID_count", axis=1)
 
-    return df
+def clean_polylines(df):
+    """
+    Keep only the trips whose polyline has 8-480 points that are all within
+    the Porto bounds, and add their point count as num_points.
+    """
+    # Count the points straight from the strings, so only polylines with a
+    # usable length have to be parsed for the bounds check
+    num_points = count_polyline_points(df["POLYLINE"])
+    usable_length = num_points.between(8, 480)
+    df_clean = df[usable_length].assign(num_points=num_points[usable_length])
 
+    valid = validate_polylines(
+        df_clean["POLYLINE"], min_polyline_points=8, max_polyline_points=480
+    )
+    return df_clean[valid].copy()
 
-# Polyline cleaning
 
-polyline_col = df["POLYLINE"]
-val_results = polyline_col.apply(
-    lambda polyline: validate_single_polyline(
-        polyline_str=polyline, min_polyline_points=8, max_polyline_points=480
-    ),
-)
-df_clean = df[val_results.apply(lambda x: x["valid"])].copy()
+def add_trip_times(df):
+    """
+    Calculate the taxi trip duration and end time from the number of points.
+
+    Uses plain int32/int64 array arithmetic, so neither column can end up as
+    float.
+    """
+    trip_duration = df["num_points"].to_numpy(dtype=np.int32) * 15
+    df["TRIP_DURATION"] = trip_duration
+    df["END_TIME"] = df["TIMESTAMP"].to_numpy(dtype=np.int64) + trip_duration
+    return df
+
 
-# Handle duplicates
-df_clean = handle_duplicates(df_clean)
+def clean_data(df):
+    """Run all cleaning steps on a raw Porto DataFrame"""
+    df_clean = clean_polylines(df)
+    df_clean = handle_duplicates(df_clean)
+    return add_trip_times(df_clean)
 
-# Calculate the taxi trip end time, and taxi trip duration
-df_clean["TRIP_DURATION"] = df_clean["num_points"] * 15
-df_clean["END_TIME"] = df_clean["TIMESTAMP"] + df_clean["TRIP_DURATION"]
 
-df_clean.to_csv(clean_file, index=False)
+def main():
+    df = load_raw(nrows=100_000)
+    df_clean = clean_data(df)
 
+    df_clean.to_parquet(clean_file, compression="zstd", index=False)
 
-# remove MISSING_DATA column, as rows affected by this has already been cleaned
-df_clean = df_clean.drop(columns="MISSING_DATA", errors="ignore")
+    print(f"Cleaned: {len(df_clean):,} rows ({len(df_clean)/len(df)*100:.1f}%)")
+    print(f"Small cleaned copy saved to {clean_file} ({len(df)} rows)")
 
-df_clean.to_csv(clean_file, index=False)
 
-print(f"Cleaned: {len(df_clean):,} rows ({len(df_clean)/len(df)*100:.1f}%)")
-print(f"Small cleaned copy saved to {clean_file} ({len(df)} rows)")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+
+raw_file = "dataset/porto/porto.csv"
+
+# MISSING_DATA is left out, as rows affected by it are removed by the polyline
+# cleaning anyway.
+# CALL_TYPE and DAY_TYPE only take the values A/B/C, so they are read as
+# dictionary encoded (categorical) columns
+RAW_COLUMN_TYPES = {
+    "TRIP_ID": pa.int64(),
+    "CALL_TYPE": pa.dictionary(pa.int32(), pa.string()),
+    "ORIGIN_CALL": pa.float64(),
+    "ORIGIN_STAND": pa.float64(),
+    "TAXI_ID": pa.int32(),
+    "TIMESTAMP": pa.int64(),
+    "DAY_TYPE": pa.dictionary(pa.int32(), pa.string()),
+    "POLYLINE": pa.string(),
+}
+
+
+@lru_cache(maxsize=1)
+def read_raw_table(filepath=raw_file, nrows=None):
+    """
+    Read the raw Porto CSV into an Arrow table with pyarrow's multithreaded
+    CSV reader.
+
+    Only the columns in RAW_COLUMN_TYPES are parsed. When nrows is given the
+    file is streamed block by block and reading stops once enough rows are in.
+    The table is cached, so the CSV is parsed only once per process.
+    """
+    read_options = pacsv.ReadOptions(block_size=64 << 20, use_threads=True)
+    convert_options = pacsv.ConvertOptions(
+        column_types=RAW_COLUMN_TYPES, include_columns=list(RAW_COLUMN_TYPES)
+    )
+
+    if nrows is None:
+        return pacsv.read_csv(
+            filepath, read_options=read_options, convert_options=convert_options
+        )
+
+    batches = []
+    row_count = 0
+    with pacsv.open_csv(
+        filepath, read_options=read_options, convert_options=convert_options
+    ) as reader:
+        for batch in reader:
+            batches.append(batch)
+            row_count += batch.num_rows
+            if row_count >= nrows:
+                break
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+
+    return table.slice(0, nrows)
+
+
+def load_raw(filepath=raw_file, nrows=None):
+    """
+    Load the raw Porto CSV as a DataFrame.
+
+    Each call returns a fresh DataFrame built from the cached Arrow table, so
+    callers are free to modify it without re-parsing the CSV.
+    """
+    return read_raw_table(filepath, nrows).to_pandas()
@@ -1,11 +1,40 @@
 import pandas as pd
+import numpy as np
 import os
-from datetime import datetime
-import ast
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from operator import itemgetter
+from datetime import datetime, timezone
+import orjson
+
+
+# Header lines every Geolife .plt file starts with
+PLT_HEADER = (
+    "Geolife trajectory\n"
+    "WGS 84\n"
+    "Altitude is in Feet\n"
+    "Reserved 3\n"
+    "0,2,255,My Track,0,0,2,8421376\n"
+    "0\n"
+)
+# Days from 1899-12-30 (day 0 of the .plt day count) to the Unix epoch
+PLT_EPOCH_OFFSET_DAYS = 25569
 
 
 def load_data(filepath="dataset/porto/porto.csv"):
-    return pd.read_csv(filepath)
+    # Only the columns written to the .plt and labels.txt files are read, with
+    # pyarrow's multithreaded parser
+    return pd.read_csv(
+        filepath,
+        engine="pyarrow",
+        usecols=["TAXI_ID", "TIMESTAMP", "CALL_TYPE", "POLYLINE"],
+        dtype={
+            "TAXI_ID": "int32",
+            "TIMESTAMP": "int64",
+            "CALL_TYPE": "category",
+            "POLYLINE": "str",
+        },
+    )
 
 
 def parse_polyline(polyline_str):
@@ -13,113 +42,132 @@ def parse_polyline(polyline_str):
     if pd.isna(polyline_str) or polyline_str == "[]":
         return []
     try:
-        return ast.literal_eval(polyline_str)
-    except:
+        return orjson.loads(polyline_str)
+    except orjson.JSONDecodeError:
         return []
 
 
-def create_trajectory_files(df, output_dir="trajectory_data"):
+def iter_taxi_trips(df, columns):
     """
-    Create .plt trajectory files for each taxi ID from the Porto dataset
+    Yield (taxi_id, trips) for each TAXI_ID, where trips iterates over plain
+    tuples of the requested columns in start time order.
+
+    The data is sorted once, so every taxi's trips form one consecutive run
+    that can be read in a single pass without a groupby.
     """
-    # Create output directory
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    df_sorted = df.sort_values(["TAXI_ID", "TIMESTAMP"], kind="stable")
+    rows = df_sorted[["TAXI_ID", *columns]].itertuples(index=False, name=None)
 
-    # Group the data by their TAXI_ID
-    taxi_groups = df.groupby("TAXI_ID")
+    for taxi_id, taxi_rows in itertools.groupby(rows, key=itemgetter(0)):
+        yield taxi_id, (row[1:] for row in taxi_rows)
 
-    for taxi_id, taxi_data in taxi_groups:
-        # Create taxi folder
-        taxi_dir = os.path.join(output_dir, f"taxi_{taxi_id:03d}")
-        trajectory_dir = os.path.join(taxi_dir, "Trajectory")
 
-        if not os.path.exists(trajectory_dir):
-            os.makedirs(trajectory_dir)
+def call_type_to_mode(call_type):
+    """Map a CALL_TYPE to the transportation mode written to labels.txt"""
+    if call_type == "A":
+        return "taxi_central"
+    if call_type == "B":
+        return "taxi_stand"
+    return "taxi_street"
 
-        # Process each trip for this TAXI_ID
-        for idx, row in taxi_data.iterrows():
-            trip_id = row["TRIP_ID"]
-            timestamp = row["TIMESTAMP"]
-            polyline = parse_polyline(row["POLYLINE"])
 
-            # Skip polylines that are empty
-            if not polyline:
-                continue
+def write_taxi_files(taxi_id, trips, output_dir):
+    """
+    Write the .plt trajectory files and the labels.txt file for one taxi.
 
-            # Create filename for a trip based on trips start time
-            start_time = datetime.fromtimestamp(timestamp)
-            filename = f"{start_time.strftime('%Y%m%d%H%M%S')}.plt"
-            filepath = os.path.join(trajectory_dir, filename)
+    trips yields (timestamp, call_type, polyline_str) tuples in start time
+    order. Each polyline is parsed once and used for both the .plt file and
+    its label line.
+    """
+    # Create taxi folder
+    taxi_dir = os.path.join(output_dir, f"taxi_{taxi_id:03d}")
+    trajectory_dir = os.path.join(taxi_dir, "Trajectory")
 
-            # Write the .plt file
-            with open(filepath, "w") as f:
-                # Write header
-                f.write("Geolife trajectory\n")
-                f.write("WGS 84\n")
-                f.write("Altitude is in Feet\n")
-                f.write("Reserved 3\n")
-                f.write("0,2,255,My Track,0,0,2,8421376\n")
-                f.write("0\n")
+    if not os.path.exists(trajectory_dir):
+        os.makedirs(trajectory_dir)
 
-                # Write GPS/polyline points
-                current_timestamp = timestamp
-                for i, (lon, lat) in enumerate(polyline):
-                    # Calculate the time for each point (15 seconds for each point)
-                    point_time = datetime.fromtimestamp(current_timestamp + i * 15)
+    label_lines = []
 
-                    # Format: lat,lon,unused,altitude,days_since_1899,date,time
-                    days_since_1899 = (point_time - datetime(1899, 12, 30)).days
+    # Process each trip for this TAXI_ID
+    for timestamp, call_type, polyline_str in trips:
+        polyline = parse_polyline(polyline_str)
 
-                    f.write(
-                        f"{lat},{lon},0,0,{days_since_1899},"
-                        f"{point_time.strftime('%Y-%m-%d')},{point_time.strftime('%H:%M:%S')}\n"
-                    )
+        # Skip polylines that are empty
+        if not polyline:
+            continue
 
-        print(f"Created trajectory files for Taxi {taxi_id}")
+        # Create filename for a trip based on trips start time
+        start_time = datetime.fromtimestamp(timestamp, timezone.utc)
+        filename = f"{start_time.strftime('%Y%m%d%H%M%S')}.plt"
+        filepath = os.path.join(trajectory_dir, filename)
 
+        # Calculate the time for each point (15 seconds for each point) as
+        # Unix seconds, and format them all at once
+        point_times = timestamp + np.arange(len(polyline), dtype=np.int64) * 15
+        days_since_1899 = point_times // 86400 + PLT_EPOCH_OFFSET_DAYS
+        point_stamps = np.datetime_as_string(
+            point_times.astype("datetime64[s]"), unit="s"
+        )
 
-def create_labels_file(df, output_dir="trajectory_data"):
-    """
-    Create labels.txt files for each taxi based on trip data
-    """
-    taxi_groups = df.groupby("TAXI_ID")
+        # Format: lat,lon,unused,altitude,days_since_1899,date,time
+        lines = [
+            f"{lat},{lon},0,0,{days},{stamp[:10]},{stamp[11:]}\n"
+            for (lon, lat), days, stamp in zip(
+                polyline, days_since_1899.tolist(), point_stamps.tolist()
+            )
+        ]
 
-    for taxi_id, taxi_data in taxi_groups:
-        taxi_dir = os.path.join(output_dir, f"taxi_{taxi_id:03d}")
+        # Write the whole .plt file with a single write call
+        with open(filepath, "w") as f:
+            f.write(PLT_HEADER + "".join(lines))
 
-        if not os.path.exists(taxi_dir):
-            continue
+        # Estimate end time based on polyline length
+        end_time = datetime.fromtimestamp(timestamp + len(polyline) * 15, timezone.utc)
+
+        # Format: start_date start_time end_date end_time mode
+        label_lines.append(
+            f"{start_time.strftime('%Y/%m/%d')} {start_time.strftime('%H:%M:%S')} "
+            f"{end_time.strftime('%Y/%m/%d')} {end_time.strftime('%H:%M:%S')} "
+            f"{call_type_to_mode(call_type)}\n"
+        )
+
+    with open(os.path.join(taxi_dir, "labels.txt"), "w") as f:
+        f.write("".join(label_lines))
 
-        labels_file = os.path.join(taxi_dir, "labels.txt")
+    print(f"Created trajectory files for Taxi {taxi_id}")
 
-        with open(labels_file, "w") as f:
-            for idx, row in taxi_data.iterrows():
-                timestamp = row["TIMESTAMP"]
-                polyline = parse_polyline(row["POLYLINE"])
 
-                if not polyline:
-                    continue
+def write_taxi_shard(shard, output_dir):
+    """Write the files for every taxi in a shard of the trip data"""
+    trip_columns = ["TIMESTAMP", "CALL_TYPE", "POLYLINE"]
+    for taxi_id, trips in iter_taxi_trips(shard, trip_columns):
+        write_taxi_files(taxi_id, trips, output_dir)
 
-                start_time = datetime.fromtimestamp(timestamp)
 
-                # Estimate end time based on polyline length
-                end_time = datetime.fromtimestamp(timestamp + len(polyline) * 15)
+def create_trajectory_files(df, output_dir="trajectory_data", max_workers=None):
+    """
+    Create .plt trajectory files and a labels.txt file for each taxi ID from
+    the Porto dataset.
+
+    Taxis are independent of each other, so the TAXI_IDs are split into one
+    shard per worker process and the shards are written in parallel.
+    """
+    # Create output directory
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
-                # Determine the transportation mode based on call type
-                call_type = row.get("CALL_TYPE", "C")
-                if call_type == "A":
-                    mode = "taxi_central"
-                elif call_type == "B":
-                    mode = "taxi_stand"
-                else:
-                    mode = "taxi_street"
+    max_workers = max_workers or os.cpu_count() or 1
+    taxi_ids = df["TAXI_ID"].unique()
+    shards = [ids for ids in np.array_split(taxi_ids, max_workers) if len(ids)]
 
-                # Format: start_date start_time end_date end_time mode
-                f.write(
-                    f"{start_time.strftime('%Y/%m/%d')} {start_time.strftime('%H:%M:%S')} "
-                    f"{end_time.strftime('%Y/%m/%d')} {end_time.strftime('%H:%M:%S')} {mode}\n"
-                )
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(write_taxi_shard, df[df["TAXI_ID"].isin(ids)], output_dir)
+            for ids in shards
+        ]
+        for future in as_completed(futures):
+            # Re-raise any error from a worker
+            future.result()
 
 
 def main():
@@ -131,7 +179,6 @@ def main():
 
     print(f"Processing {len(df)} trips from {df['TAXI_ID'].nunique()} taxis")
     create_trajectory_files(df)
-    create_labels_file(df)
 
     print("Trajectory files created successfully!")
 
@@ -1,40 +1,53 @@
 import numpy as np
 import pandas as pd
-import glob
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import os.path
 import datetime
 import os
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+# Column layout of the GPS point lines in a .plt file, after the 6 header lines.
+# float32 keeps the 6 decimals of the coordinates to within ~0.1 m, at half the memory.
+# Files are small and read in parallel processes, so pyarrow's own threads are off
+plt_read_options = pacsv.ReadOptions(
+    skip_rows=6,
+    column_names=['lat', 'lon', 'unused', 'alt', 'days', 'date', 'time'],
+    use_threads=False,
+)
+plt_convert_options = pacsv.ConvertOptions(
+    column_types={'lat': pa.float32(), 'lon': pa.float32(), 'alt': pa.float32(),
+                  'date': pa.string(), 'time': pa.string()},
+    include_columns=['lat', 'lon', 'alt', 'date', 'time'],
+)
 
 def read_plt(plt_file):
     """
-    Read a single .plt trajectory file and return the GPS points as a DataFrame
+    Read a single .plt trajectory file and return the GPS points as an Arrow table,
+    with the date and time still as strings
     """
     try:
-        # Check if the file exists and isn´t empty
-        if not os.path.exists(plt_file) or os.path.getsize(plt_file) == 0:
+        # Check if the file exists and isn´t empty, with a single stat call
+        try:
+            file_size = os.stat(plt_file).st_size
+        except FileNotFoundError:
+            file_size = 0
+        if file_size == 0:
             print(f"Warning: Empty or missing file {plt_file}")
             return None
             
-        points = pd.read_csv(plt_file, skiprows=6, header=None,
-                             parse_dates=[[5, 6]], infer_datetime_format=True)
+        points = pacsv.read_csv(plt_file, read_options=plt_read_options,
+                                convert_options=plt_convert_options)
 
         # Check if the file has any data points
-        if points.empty:
+        if points.num_rows == 0:
             print(f"Warning: No data found in {plt_file}")
             return None
 
-        # Renamed columns
-        points.rename(inplace=True, columns={'5_6': 'time', 0: 'lat', 1: 'lon', 3: 'alt'})
-
-        # Remove unused columns
-        points.drop(inplace=True, columns=[2, 4])
-
         return points
         
-    except pd.errors.EmptyDataError:
-        print(f"Warning: Empty data in file {plt_file}")
-        return None
     except Exception as e:
         print(f"Warning: Error reading {plt_file}: {e}")
         return None
@@ -43,6 +56,7 @@ def read_plt(plt_file):
 mode_names = ['taxi_stand', 'taxi_central', 'taxi_street']
 mode_ids = {s : i + 1 for i, s in enumerate(mode_names)}
 mode_ids['unknown'] = 0  # For weird points that doesn´t fit into any label 
+id_to_mode = {v : k for k, v in mode_ids.items()}
 
 def read_labels(labels_file):
     """
@@ -92,52 +106,75 @@ def read_labels(labels_file):
 def apply_labels(points, labels):
     """
     Apply transportation mode labels to points based on time intervals
+
+    The points must be sorted by time. Each label interval then covers one
+    consecutive range of points, which is found with a binary search instead
+    of a boolean mask over all points.
     """
     # If the label file doesn´t exist or is empty, mark all points as unknown and exit
     if labels is None or labels.empty:
-        points['label'] = 0 
-        points['label_name'] = 'unknown'
+        points['label'] = np.zeros(len(points), dtype=np.int8)
         return
     
     # Initialize all label points as unknown in the start
-    points['label'] = 0
-    points['label_name'] = 'unknown'
+    point_labels = np.zeros(len(points), dtype=np.int8)
+
+    # First and one-past-last point inside each label's time interval
+    start_idx = points['time'].searchsorted(labels['start_time'], side='left')
+    end_idx = points['time'].searchsorted(labels['end_time'], side='right')
     
     # For each time interval in the label file, set the corresponding call type for the points
-    for _, label_row in labels.iterrows():
-        mask = (points['time'] >= label_row['start_time']) & \
-               (points['time'] <= label_row['end_time'])
-        points.loc[mask, 'label'] = label_row['label']
-        
-        # Also add the label names, not just the id
-        label_name = [k for k, v in mode_ids.items() if v == label_row['label']]
-        if label_name:
-            points.loc[mask, 'label_name'] = label_name[0]
+    for start, end, label in zip(start_idx, end_idx, labels['label']):
+        point_labels[start:end] = label
+
+    points['label'] = point_labels
+
+def scan_plt_files(directory):
+    """
+    List the .plt files in a directory with os.scandir, or [] if it doesn´t exist
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return [e.path for e in entries if e.name.endswith('.plt') and e.is_file()]
+    except FileNotFoundError:
+        return []
+
+def find_plt_files(taxi_folder):
+    """
+    Find the .plt files of a TAXI_ID, in its Trajectory folder or else directly in the taxi folder
+    """
+    plt_files = scan_plt_files(os.path.join(taxi_folder, 'Trajectory'))
+    if not plt_files:
+        plt_files = scan_plt_files(taxi_folder)
+    return plt_files
 
 def read_taxi(taxi_folder):
     """
     Read all trajectory files for a single TAXI_ID
     """
-    plt_files = glob.glob(os.path.join(taxi_folder, 'Trajectory', '*.plt'))
-    if not plt_files:
-        plt_files = glob.glob(os.path.join(taxi_folder, '*.plt'))
+    plt_files = find_plt_files(taxi_folder)
     
     # Return an empty DataFrame if there are no files to read
     if not plt_files:
         return pd.DataFrame()
     
     # Read all files, filtering out None and empty results
-    valid_dfs = []
+    valid_tables = []
     for plt_file in plt_files:
-        df = read_plt(plt_file)
-        if df is not None and not df.empty:
-            valid_dfs.append(df)
+        table = read_plt(plt_file)
+        if table is not None:
+            valid_tables.append(table)
     
-    if not valid_dfs:
+    if not valid_tables:
         print(f"Warning: No valid trajectory files in {taxi_folder}")
         return pd.DataFrame()
     
-    df = pd.concat(valid_dfs, ignore_index=True)
+    # Combine the Arrow tables and convert to pandas once per taxi
+    df = pa.concat_tables(valid_tables).to_pandas()
+    # Parse all timestamps of the taxi in one call with the known .plt format
+    timestamps = df.pop('date') + ' ' + df.pop('time')
+    time = pd.to_datetime(timestamps, format='%Y-%m-%d %H:%M:%S', cache=True)
+    df.insert(0, 'time', time.astype('datetime64[s]'))  # GPS points are whole seconds
     
     # Sort all the paths in the dataframe by time to ensure proper ordering
     df = df.sort_values('time').reset_index(drop=True)
@@ -147,43 +184,119 @@ def read_taxi(taxi_folder):
         labels = read_labels(labels_file)
         apply_labels(df, labels)
     else:
-        df['label'] = 0  # Unknown
-        df['label_name'] = 'unknown'
+        df['label'] = np.zeros(len(df), dtype=np.int8)  # Unknown
 
     return df
 
-def read_all_taxis(folder):
+def read_taxi_folder(folder, sf):
+    """
+    Read the trajectories of one taxi folder and tag them with its TAXI_ID
+    """
+    df = read_taxi(os.path.join(folder, sf))
+
+    if not df.empty:
+        # Extract taxi ID from folder name (e.g., 'taxi_20000001' -> 20000001)
+        taxi_id = int(sf.split('_')[1])
+        df['taxi'] = np.full(len(df), taxi_id, dtype=np.uint32)
+
+    return df
+
+def read_all_taxis(folder, max_workers=None):
     """
     Read all trajectory data from all taxis
+
+    The taxi folders are independent of each other, so they are read in
+    parallel worker processes
     """
     subfolders = [f for f in os.listdir(folder) if f.startswith('taxi_')]
-    dfs = []
+    # The arrays of every taxi, per column, so each column is concatenated
+    # into one allocation at the end
+    column_parts = {}
     successful_taxis = 0
     
-    for i, sf in enumerate(subfolders):
-        print('[%d/%d] processing taxi %s' % (i + 1, len(subfolders), sf))
-        df = read_taxi(os.path.join(folder, sf))
-        
-        if not df.empty:
-            # Extract taxi ID from folder name (e.g., 'taxi_20000001' -> 20000001)
-            taxi_id = int(sf.split('_')[1])
-            df['taxi'] = taxi_id
-            dfs.append(df)
-            successful_taxis += 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(read_taxi_folder, repeat(folder), subfolders, chunksize=4)
+
+        for i, (sf, df) in enumerate(zip(subfolders, results)):
+            print('[%d/%d] processed taxi %s' % (i + 1, len(subfolders), sf))
+            
+            if not df.empty:
+                for column, values in df.items():
+                    column_parts.setdefault(column, []).append(values.to_numpy())
+                successful_taxis += 1
     
     print(f"Successfully processed {successful_taxis} out of {len(subfolders)} taxis")
     
-    if dfs:
-        return pd.concat(dfs, ignore_index=True)
-    else:
-        return pd.DataFrame()
+    return pd.DataFrame({column: np.concatenate(parts) for column, parts in column_parts.items()})
+
+# Columns and dtypes of the DataFrame load_porto_trajectories builds. A cached
+# DataFrame with any other layout was written by an older version and is rebuilt
+trajectory_dtypes = {
+    'time': 'datetime64[s]',
+    'lat': 'float32',
+    'lon': 'float32',
+    'alt': 'float32',
+    'label': 'int8',
+    'taxi': 'uint32',
+    'hour': 'int8',
+}
+
+def newest_trajectory_mtime(trajectory_dir):
+    """
+    Newest modification time of the trajectory data: the taxi folders, their
+    Trajectory folders and their .plt and labels.txt files
+    """
+    newest = os.stat(trajectory_dir).st_mtime
+    for sf in os.listdir(trajectory_dir):
+        if not sf.startswith('taxi_'):
+            continue
+        taxi_folder = os.path.join(trajectory_dir, sf)
+        paths = [taxi_folder, os.path.join(taxi_folder, 'Trajectory'),
+                 os.path.join(taxi_folder, 'labels.txt'), *find_plt_files(taxi_folder)]
+        for path in paths:
+            try:
+                newest = max(newest, os.stat(path).st_mtime)
+            except FileNotFoundError:
+                pass
+    return newest
+
+def read_trajectory_cache(cache_path, trajectory_dir):
+    """
+    Read the cached trajectories, or return None if there is no cache, it is
+    older than the trajectory files, or its columns don´t match trajectory_dtypes
+    """
+    if not os.path.exists(cache_path) or not os.path.isdir(trajectory_dir):
+        return None
+    if os.path.getmtime(cache_path) < newest_trajectory_mtime(trajectory_dir):
+        print(f"Trajectory files changed since {cache_path} was written, rebuilding it")
+        return None
+
+    df = pd.read_feather(cache_path)
+    if df.dtypes.astype(str).to_dict() != trajectory_dtypes:
+        print(f"{cache_path} has an outdated layout, rebuilding it")
+        return None
+    return df
 
 def load_porto_trajectories(trajectory_dir="trajectory_data"):
     """
     Main function to load all Porto taxi trajectories
+
+    The combined DataFrame is saved as <trajectory_dir>.feather after the
+    first run, so later runs skip reading every .plt file. The cache is rebuilt
+    when any trajectory file is newer than it, or when its columns don´t match
+    what this loader produces.
     """
-    print(f"Loading trajectories from {trajectory_dir}...")
-    df = read_all_taxis(trajectory_dir)
+    cache_path = f"{os.path.normpath(trajectory_dir)}.feather"
+    df = read_trajectory_cache(cache_path, trajectory_dir)
+    if df is not None:
+        print(f"Loading cached trajectories from {cache_path}...")
+    else:
+        print(f"Loading trajectories from {trajectory_dir}...")
+        df = read_all_taxis(trajectory_dir)
+        if not df.empty:
+            # Store the hour of each point, once for all the analysis functions
+            df['hour'] = df['time'].dt.hour.astype('int8')
+            df.to_feather(cache_path)
     
     if df.empty:
         print("No trajectory data found!")
@@ -195,12 +308,12 @@ def load_porto_trajectories(trajectory_dir="trajectory_data"):
     print(f"\nColumns: {list(df.columns)}")
     print(f"Date range: {df['time'].min()} to {df['time'].max()}")
  
-    if 'label_name' in df.columns:
+    if 'label' in df.columns:
         print("\nLabel distribution:")
-        label_counts = df['label_name'].value_counts()
+        label_counts = df['label'].value_counts()
         for label, count in label_counts.items():
             percentage = (count / len(df)) * 100
-            print(f"  {label}: {count} points ({percentage:.1f}%)")
+            print(f"  {id_to_mode[label]}: {count} points ({percentage:.1f}%)")
     
     return df
 
@@ -215,9 +328,14 @@ def visualize_trajectories(df, sample_size=100000, color_by_label=False):
     else:
         df_sample = df
     
+    # Take the columns out as plain NumPy arrays once, so the masks per label
+    # below don't build new DataFrames
+    lons = df_sample['lon'].to_numpy()
+    lats = df_sample['lat'].to_numpy()
+    
     plt.figure(figsize=(15, 10))
     
-    if color_by_label and 'label_name' in df_sample.columns:
+    if color_by_label and 'label' in df_sample.columns:
         label_colors = {
             'taxi_stand': 'blue',
             'taxi_central': 'red',
@@ -225,17 +343,19 @@ def visualize_trajectories(df, sample_size=100000, color_by_label=False):
             'unknown': 'gray'
         }
         
-        for label in df_sample['label_name'].unique():
-            label_data = df_sample[df_sample['label_name'] == label]
-            plt.scatter(label_data['lon'], label_data['lat'], 
+        point_labels = df_sample['label'].to_numpy()
+        for label in pd.unique(point_labels):
+            mask = point_labels == label
+            label_name = id_to_mode[label]
+            plt.scatter(lons[mask], lats[mask], 
                        alpha=0.6, s=0.5, 
-                       color=label_colors.get(label, 'gray'),
-                       label=f"{label} ({len(label_data)} points)")
+                       color=label_colors.get(label_name, 'gray'),
+                       label=f"{label_name} ({mask.sum()} points)")
         
         plt.legend()
         plt.title('Porto Taxi Trajectories (Colored by Location Type)')
     else:
-        plt.scatter(df_sample['lon'], df_sample['lat'], alpha=0.1, s=0.1)
+        plt.scatter(lons, lats, alpha=0.1, s=0.1)
         plt.title('Porto Taxi Trajectories')
     
     plt.xlabel('Longitude')
@@ -255,7 +375,7 @@ def visualize_individual_taxi(df, taxi_id, max_trips=5, color_by_label=False):
     
     plt.figure(figsize=(15, 10))
     
-    if color_by_label and 'label_name' in taxi_data.columns:
+    if color_by_label and 'label' in taxi_data.columns:
         label_colors = {
             'taxi_stand': 'blue',
             'taxi_central': 'red', 
@@ -263,13 +383,14 @@ def visualize_individual_taxi(df, taxi_id, max_trips=5, color_by_label=False):
             'unknown': 'gray'
         }
         
-        for label in taxi_data['label_name'].unique():
-            label_data = taxi_data[taxi_data['label_name'] == label]
+        for label in taxi_data['label'].unique():
+            label_data = taxi_data[taxi_data['label'] == label]
+            label_name = id_to_mode[label]
             if not label_data.empty:
                 plt.scatter(label_data['lon'], label_data['lat'], 
                            alpha=0.7, s=20, 
-                           color=label_colors.get(label, 'gray'),
-                           label=f"{label} ({len(label_data)} points)")
+                           color=label_colors.get(label_name, 'gray'),
+                           label=f"{label_name} ({len(label_data)} points)")
         
         plt.legend()
         plt.title(f'Taxi {taxi_id} Trajectories (Colored by Location Type)')
@@ -296,7 +417,7 @@ def analyze_label_patterns(df):
     """
     Analyze patterns in taxi location labels
     """
-    if 'label_name' not in df.columns:
+    if 'label' not in df.columns:
         print("No label data available for analysis")
         return
     
@@ -306,17 +427,20 @@ def analyze_label_patterns(df):
     
     # Overall distribution of labels
     print("\n1. Overall Label Distribution:")
-    label_counts = df['label_name'].value_counts()
+    label_counts = df['label'].value_counts()
     for label, count in label_counts.items():
         percentage = (count / len(df)) * 100
-        print(f"   {label}: {count:,} points ({percentage:.1f}%)")
+        print(f"   {id_to_mode[label]}: {count:,} points ({percentage:.1f}%)")
     
     # Hourly label patterns
     if not df.empty:
-        df['hour'] = df['time'].dt.hour
+        if 'hour' not in df.columns:
+            df['hour'] = df['time'].dt.hour.astype('int8')
         
         print("\n2. Hourly Activity Patterns:")
-        hourly_labels = df.groupby(['hour', 'label_name']).size().unstack(fill_value=0)
+        # Group on the integer label ids and only name the columns afterwards
+        hourly_labels = df.groupby(['hour', 'label']).size().unstack(fill_value=0)
+        hourly_labels = hourly_labels.rename(columns=id_to_mode)
         
         plt.figure(figsize=(15, 8))
         
@@ -359,9 +483,9 @@ def get_trajectory_stats(df):
     }
     
     # Add label statistics if the file has labels available
-    if 'label_name' in df.columns:
-        stats['label_distribution'] = df['label_name'].value_counts()
-        stats['taxis_with_labels'] = df[df['label_name'] != 'unknown']['taxi'].nunique()
+    if 'label' in df.columns:
+        stats['label_distribution'] = df['label'].value_counts().rename(index=id_to_mode)
+        stats['taxis_with_labels'] = df[df['label'] != mode_ids['unknown']]['taxi'].nunique()
     
     return stats
 
@@ -374,10 +498,7 @@ def debug_plt_files(trajectory_dir="trajectory_data", max_check=5):
     checked = 0
     for sf in subfolders[:max_check]:
         taxi_folder = os.path.join(trajectory_dir, sf)
-        plt_files = glob.glob(os.path.join(taxi_folder, 'Trajectory', '*.plt'))
-        
-        if not plt_files:
-            plt_files = glob.glob(os.path.join(taxi_folder, '*.plt'))
+        plt_files = find_plt_files(taxi_folder)
         
         print(f"\nChecking taxi {sf}:")
         print(f"  Found {len(plt_files)} .plt files")
@@ -391,7 +512,10 @@ def debug_plt_files(trajectory_dir="trajectory_data", max_check=5):
 
         # Checks the first three files because we have too much data
         for plt_file in plt_files[:3]:
-            file_size = os.path.getsize(plt_file) if os.path.exists(plt_file) else 0
+            try:
+                file_size = os.stat(plt_file).st_size
+            except FileNotFoundError:
+                file_size = 0
             print(f"  File: {os.path.basename(plt_file)}, Size: {file_size} bytes")
             
             if file_size > 0:
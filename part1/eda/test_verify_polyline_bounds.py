@@ -0,0 +1,65 @@
+"""
+Regression checks that the per-row and the batched polyline classifiers
+report the same reason for every polyline.
+
+Run with pytest, or directly with: python part1/eda/test_verify_polyline_bounds.py
+"""
+
+import pandas as pd
+
+from verify_polyline_bounds import (
+    POLYLINE_REASONS,
+    classify_polylines,
+    validate_single_polyline,
+)
+
+MIN_POINTS = 8
+MAX_POINTS = 480
+
+
+def polyline(points):
+    return "[" + ", ".join(f"[{lon}, {lat}]" for lon, lat in points) + "]"
+
+
+def reasons_per_row(polylines):
+    return [
+        validate_single_polyline(p, MIN_POINTS, MAX_POINTS)["reason"]
+        for p in polylines
+    ]
+
+
+def reasons_batched(polylines):
+    codes = classify_polylines(pd.Series(polylines), MIN_POINTS, MAX_POINTS)
+    return [POLYLINE_REASONS[code] for code in codes]
+
+
+def test_non_pair_points_are_malformed():
+    polylines = [
+        "[1,2]",
+        "[" + ", ".join(["[-8.6]"] * 10) + "]",
+    ]
+    assert reasons_per_row(polylines) == ["malformed", "malformed"]
+    assert reasons_batched(polylines) == ["malformed", "malformed"]
+
+
+def test_classifiers_agree():
+    polylines = [
+        None,
+        "[]",
+        "[[]]",
+        "[1,2]",
+        "[" + ", ".join(["[-8.6]"] * 10) + "]",
+        "oops",
+        polyline([(-8.6, 41.15)] * 3),
+        polyline([(-8.6, 41.15)] * 20),
+        polyline([(-8.6, 41.15)] * 500),
+        polyline([(-8.6, 41.15)] * 19 + [(-9.5, 41.15)]),
+        polyline([(-8.6, 41.15)] * 19)[:-1] + ", [oops",
+    ]
+    assert reasons_per_row(polylines) == reasons_batched(polylines)
+
+
+if __name__ == "__main__":
+    test_non_pair_points_are_malformed()
+    test_classifiers_agree()
+    print("All checks passed")
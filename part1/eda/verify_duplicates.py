@@ -1,8 +1,39 @@
+import os
 import time
 import pandas as pd
 
-def load_data(filepath="dataset/porto/porto.csv"):
-    return pd.read_csv(filepath)
+def load_data(
+    filepath="dataset/porto/porto.csv",
+    cache_path="dataset/porto/porto_duplicates_cache.feather",
+):
+    """
+    Load the Porto CSV. The parsed DataFrame is saved as Feather after the
+    first run, and later runs read that copy as long as the CSV is unchanged.
+    """
+    if os.path.exists(cache_path) and os.path.getmtime(
+        cache_path
+    ) >= os.path.getmtime(filepath):
+        return pd.read_feather(cache_path)
+
+    # Every column is used by the duplicate checks, so all are read, but with
+    # explicit types and pyarrow's multithreaded parser
+    df = pd.read_csv(
+        filepath,
+        engine="pyarrow",
+        dtype={
+            "TRIP_ID": "int64",
+            "CALL_TYPE": "category",
+            "ORIGIN_CALL": "float64",
+            "ORIGIN_STAND": "float64",
+            "TAXI_ID": "int32",
+            "TIMESTAMP": "int64",
+            "DAY_TYPE": "category",
+            "MISSING_DATA": "bool",
+            "POLYLINE": "str",
+        },
+    )
+    df.to_feather(cache_path)
+    return df
 
 
 def check_duplicate_trip_ids(df):
@@ -17,20 +48,27 @@ def check_duplicate_trip_ids(df):
     print("Antall dupliserte TRIP_ID:", duplicate_trip_ids.shape[0])
     print(duplicate_trip_ids.head())
 
+    # Classify all duplicated TRIP_IDs with one groupby, instead of scanning
+    # the whole column once per duplicated ID
+    dups = df[df["TRIP_ID"].duplicated(keep=False)]
+    grouped = dups.drop(columns=["TRIP_ID"]).groupby(dups["TRIP_ID"])
+    is_identical = grouped.nunique().max(axis=1) == 1
+    has_duplicate_rows = dups.duplicated().groupby(dups["TRIP_ID"]).any()
+    group_positions = grouped.indices
+
     identical_count = 0
     different_count = 0
 
     for trip_id in duplicate_trip_ids.index:
-        duplicates = df[df["TRIP_ID"] == trip_id]
+        duplicates = dups.iloc[group_positions[trip_id]]
         rows_without_trip_id = duplicates.drop(columns=["TRIP_ID"])
 
-        if rows_without_trip_id.nunique().max() == 1:
+        if is_identical[trip_id]:
             identical_count += 1
             print(f"\nTRIP_ID {trip_id} has duplicate rows that are identical:")
             print(duplicates)
         else:
-            has_duplicates = rows_without_trip_id.duplicated().any()
-            if has_duplicates:
+            if has_duplicate_rows[trip_id]:
                 different_count += 1
                 print(f"\nTRIP_ID {trip_id} has duplicate rows that are different:")
                 print(duplicates)
@@ -49,7 +87,13 @@ def check_duplicate_rows(df):
         df: DataFrame containing the data with a 'TRIP_ID' column.
     """
     df_without_trip_id = df.drop(columns=["TRIP_ID"])
-    duplicates = df_without_trip_id.duplicated()
+
+    # Hash every row to a single uint64 and only compare the full rows (with
+    # their long POLYLINE strings) for the few rows that share a hash
+    row_hashes = pd.util.hash_pandas_object(df_without_trip_id, index=False)
+    candidates = row_hashes.duplicated(keep=False)
+    duplicates = pd.Series(False, index=df.index)
+    duplicates[candidates] = df_without_trip_id[candidates].duplicated()
     print("\nChecking for duplicate rows (ignoring TRIP_ID):")
     print(f"Number of duplicate rows (ignoring TRIP_ID): {duplicates.sum()}")
     if duplicates.sum() > 0:
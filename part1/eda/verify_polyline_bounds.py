@@ -1,11 +1,15 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import matplotlib.pyplot as plt
 from scipy.stats import gaussian_kde
 import folium
-import json
+import orjson
 import math
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 """
 Porto Taxi Dataset - Polyline Bounds Validation
@@ -20,9 +24,42 @@ AI Assistance Attribution:
 MIN_POLYLINE_POINTS = 8
 MAX_POLYLINE_POINTS = 480  # 2 hours
 
+# Number of trip lengths the KDE curve in visualize_distribution is fitted on
+KDE_SAMPLE_SIZE = 50_000
 
-def load_data(filepath="dataset/porto/porto.csv"):
-    return pd.read_csv(filepath)
+# Reasons a polyline can be classified with, as returned by classify_polylines
+POLYLINE_REASONS = (
+    "empty",
+    "too_short",
+    "too_long",
+    "out_of_bounds",
+    "malformed",
+    "valid",
+)
+
+
+def load_data(
+    filepath="dataset/porto/porto.csv",
+    cache_path="dataset/porto/porto_bounds_cache.feather",
+):
+    """
+    Load the Porto CSV. The parsed DataFrame is saved as Feather after the
+    first run, and later runs read that copy as long as the CSV is unchanged.
+    """
+    if os.path.exists(cache_path) and os.path.getmtime(
+        cache_path
+    ) >= os.path.getmtime(filepath):
+        return pd.read_feather(cache_path)
+
+    # Only the polylines and their MISSING_DATA flag are used by this script
+    df = pd.read_csv(
+        filepath,
+        engine="pyarrow",
+        usecols=["POLYLINE", "MISSING_DATA"],
+        dtype={"POLYLINE": "str", "MISSING_DATA": "bool"},
+    )
+    df.to_feather(cache_path)
+    return df
 
 
 # found lat and lon: https://latitude.to/map/pt/portugal/cities/porto
@@ -102,7 +139,37 @@ def calculate_bounding_box_coord(radius):
 # Create bounds for Porto metropolitan area (30km radius from center)
 PORTO_BOUNDS = calculate_bounding_box_coord(radius=30)
 
-print(f"Calculated bounds: {PORTO_BOUNDS}")
+# The same bounds as [longitude, latitude] arrays, in the column order of the
+# coordinate arrays, so they broadcast against them without dict lookups
+PORTO_BOUNDS_MIN = np.array([PORTO_BOUNDS["min_lon"], PORTO_BOUNDS["min_lat"]])
+PORTO_BOUNDS_MAX = np.array([PORTO_BOUNDS["max_lon"], PORTO_BOUNDS["max_lat"]])
+
+
+def count_polyline_points(polylines):
+    """
+    Count the GPS points of every polyline without parsing the JSON.
+
+    Each point opens exactly one "[" inside the outer brackets, so the number
+    of points is the number of "[" minus one ("[]" gives 0). Missing polylines
+    are counted as 0 points.
+
+    Args:
+        polylines: Series of polyline JSON strings
+
+    Returns:
+        Series of point counts (int32) with the same index as polylines
+    """
+    counts = polylines.str.count(r"\[").fillna(1) - 1
+    return counts.clip(lower=0).astype("int32")
+
+
+def is_point_array(coords):
+    """
+    Check that parsed coordinates have the shape of a polyline: (n_points, 2),
+    one [longitude, latitude] pair per point. Both validate_single_polyline and
+    parse_polylines treat any other shape as malformed.
+    """
+    return coords.ndim == 2 and coords.shape[1] == 2
 
 
 def validate_single_polyline(polyline_str, min_polyline_points, max_polyline_points):
@@ -139,14 +206,27 @@ def validate_single_polyline(polyline_str, min_polyline_points, max_polyline_poi
         if pd.isna(polyline_str) or polyline_str == "[]":
             return {"valid": False, "reason": "empty", "point_count": 0}
 
+        # Reject polylines that are too short or too long by their "[" count
+        # before paying for the JSON parse (one "[" per point plus the outer one).
+        # A malformed polyline of such a length is reported by its length
+        estimated_count = polyline_str.count("[") - 1
+        if 1 <= estimated_count < min_polyline_points:
+            return {"valid": False, "reason": "too_short", "point_count": estimated_count}
+        if estimated_count > max_polyline_points:
+            return {"valid": False, "reason": "too_long", "point_count": estimated_count}
+
         # Parse JSON
-        polyline = json.loads(polyline_str)
+        polyline = orjson.loads(polyline_str)
         if not polyline:
             return {"valid": False, "reason": "empty", "point_count": 0}
 
         # Convert to numpy array for VECTORIZED operations (much faster than loops)
         # Shape will be (n_points, 2) where each row is [longitude, latitude]
         coords = np.array(polyline, dtype=float)
+        if coords.size == 0:
+            return {"valid": False, "reason": "empty", "point_count": 0}
+        if not is_point_array(coords):
+            return {"valid": False, "reason": "malformed", "point_count": None}
         point_count = coords.shape[0]
 
         # Check minimum points
@@ -157,17 +237,9 @@ def validate_single_polyline(polyline_str, min_polyline_points, max_polyline_poi
         if point_count > max_polyline_points:
             return {"valid": False, "reason": "too_long", "point_count": point_count}
 
-        # Extract all longitudes and latitudes as separate arrays
-        lons = coords[:, 0]  # First column: all longitude values
-        lats = coords[:, 1]  # Second column: all latitude values
-
-        # Check if ALL points are within bounds (numpy optimized in C)
-        in_bounds = (
-            (lons >= PORTO_BOUNDS["min_lon"])
-            & (lons <= PORTO_BOUNDS["max_lon"])
-            & (lats >= PORTO_BOUNDS["min_lat"])
-            & (lats <= PORTO_BOUNDS["max_lat"])
-        )
+        # Check if ALL points are within bounds (numpy optimized in C).
+        # Each [longitude, latitude] row is compared to the bounds arrays
+        in_bounds = (coords >= PORTO_BOUNDS_MIN) & (coords <= PORTO_BOUNDS_MAX)
 
         if not in_bounds.all():
             return {
@@ -183,63 +255,269 @@ def validate_single_polyline(polyline_str, min_polyline_points, max_polyline_poi
         return {"valid": False, "reason": "malformed", "point_count": None}
 
 
-def count_invalid_trips(df, min_points, max_points):
+def parse_polylines(polylines):
     """
-    Count invalid trips by category with progress tracking.
+    Parse a column of polylines into one columnar Arrow array.
 
-    Separates length-based invalidity from geographic invalidity.
+    Every polyline is parsed once and its points are stored in a
+    ListArray<FixedSizeList<float64, 2>>: one flat buffer with all coordinates
+    plus an offset per trip. Numeric checks can then run over all trips at
+    once, without touching Python lists again.
+
+    Args:
+        polylines: Series of polyline JSON strings
 
     Returns:
-        Dictionary with counts by reason and missing_data status
+        pyarrow ListArray with the [longitude, latitude] points of each
+        polyline. Malformed polylines are null, missing ones are empty.
     """
-    polylines = df["POLYLINE"]
-    missing = df["MISSING_DATA"]
-
-    # Counters for trips with MISSING_DATA=True
-    counts_missing = {
-        "empty": 0,
-        "too_short": 0,
-        "too_long": 0,
-        "out_of_bounds": 0,
-        "malformed": 0,
-        "valid": 0,
-    }
+    point_counts = np.zeros(len(polylines), dtype=np.int64)
+    parsed = []
+
+    for i, polyline_str in enumerate(polylines):
+        if pd.isna(polyline_str):
+            continue
+        try:
+            coords = np.array(orjson.loads(polyline_str), dtype=float)
+        except Exception:
+            point_counts[i] = -1
+            continue
+        if coords.size == 0:
+            continue
+        if not is_point_array(coords):
+            point_counts[i] = -1
+            continue
+        parsed.append(coords)
+        point_counts[i] = coords.shape[0]
+
+    flat = np.concatenate(parsed).ravel() if parsed else np.empty(0)
+    offsets = np.zeros(len(point_counts) + 1, dtype=np.int32)
+    np.cumsum(np.maximum(point_counts, 0), out=offsets[1:])
+
+    points = pa.FixedSizeListArray.from_arrays(pa.array(flat, type=pa.float64()), 2)
+    return pa.ListArray.from_arrays(
+        pa.array(offsets), points, mask=pa.array(point_counts < 0)
+    )
 
-    # Counters for trips with MISSING_DATA=False
-    counts_valid_flag = {
-        "empty": 0,
-        "too_short": 0,
-        "too_long": 0,
-        "out_of_bounds": 0,
-        "malformed": 0,
-        "valid": 0,
-    }
 
-    for i, (poly, miss) in enumerate(zip(polylines, missing)):
-        if i % 100000 == 0 and i > 0:
-            total_invalid = (
-                sum(counts_missing.values())
-                + sum(counts_valid_flag.values())
-                - counts_missing["valid"]
-                - counts_valid_flag["valid"]
-            )
-            print(
-                f"  Progress: {i:,}/{len(polylines):,} ({i / len(polylines) * 100:.1f}%) - Invalid so far: {total_invalid:,}"
+def polyline_array_to_numpy(polyline_array):
+    """
+    Get NumPy views of a parsed polyline array.
+
+    Returns:
+        Tuple (coords, point_counts):
+        - coords: float array of shape (total_points, 2) with [longitude, latitude]
+        - point_counts: int array with the number of points of each polyline,
+          -1 for malformed polylines
+    """
+    coords = polyline_array.values.flatten().to_numpy().reshape(-1, 2)
+    point_counts = np.diff(polyline_array.offsets.to_numpy())
+    point_counts[polyline_array.is_null().to_numpy(zero_copy_only=False)] = -1
+    return coords, point_counts
+
+
+def classify_polylines(polylines, min_polyline_points, max_polyline_points):
+    """
+    Classify a whole column of polylines at once.
+
+    Applies the same rules as validate_single_polyline, but the bounds check
+    is a single NumPy pass over the points of every trip, reduced per trip
+    with np.logical_and.reduceat, instead of one check per row.
+
+    Args:
+        polylines: Series of polyline JSON strings
+        min_polyline_points: Minimum number of points required
+        max_polyline_points: Maximum number of points allowed
+
+    Returns:
+        int8 array with the index into POLYLINE_REASONS of each polyline
+    """
+    polylines = pd.Series(np.asarray(polylines, dtype=object))
+
+    # Estimate the point counts from the "[" count (see count_polyline_points).
+    # Polylines that are too short or too long by that count are rejected
+    # without parsing, so a malformed one is reported by its length. Tiny
+    # strings with at most one "[" are still parsed to tell "[]" from garbage.
+    estimated_counts = (polylines.str.count(r"\[") - 1).to_numpy(dtype=float)
+    too_short = (estimated_counts >= 1) & (estimated_counts < min_polyline_points)
+    too_long = estimated_counts > max_polyline_points
+    to_parse = ~(too_short | too_long)
+
+    reasons = np.empty(len(polylines), dtype=np.int8)
+    reasons[too_short] = POLYLINE_REASONS.index("too_short")
+    reasons[too_long] = POLYLINE_REASONS.index("too_long")
+    reasons[to_parse] = classify_parsed_polylines(
+        parse_polylines(polylines[to_parse]),
+        min_polyline_points,
+        max_polyline_points,
+    )
+
+    return reasons
+
+
+def classify_parsed_polylines(polyline_array, min_polyline_points, max_polyline_points):
+    """
+    Classify polylines that are already parsed with parse_polylines.
+
+    Returns:
+        int8 array with the index into POLYLINE_REASONS of each polyline
+    """
+    coords, point_counts = polyline_array_to_numpy(polyline_array)
+
+    in_bounds = ((coords >= PORTO_BOUNDS_MIN) & (coords <= PORTO_BOUNDS_MAX)).all(
+        axis=1
+    )
+
+    # Reduce the point mask per trip; trips without points have no segment
+    has_points = point_counts > 0
+    starts = polyline_array.offsets.to_numpy()[:-1]
+    all_in_bounds = np.zeros(len(point_counts), dtype=bool)
+    if has_points.any():
+        all_in_bounds[has_points] = np.logical_and.reduceat(
+            in_bounds, starts[has_points]
+        )
+
+    # Apply the checks from last to first, so the first failing check
+    # validate_single_polyline would report is the one that sticks
+    reasons = np.full(len(point_counts), POLYLINE_REASONS.index("valid"), dtype=np.int8)
+    reasons[~all_in_bounds] = POLYLINE_REASONS.index("out_of_bounds")
+    reasons[point_counts > max_polyline_points] = POLYLINE_REASONS.index("too_long")
+    reasons[point_counts < min_polyline_points] = POLYLINE_REASONS.index("too_short")
+    reasons[point_counts == 0] = POLYLINE_REASONS.index("empty")
+    reasons[point_counts < 0] = POLYLINE_REASONS.index("malformed")
+
+    return reasons
+
+
+def validate_polylines(polylines, min_polyline_points, max_polyline_points):
+    """
+    Validate a whole column of polylines at once.
+
+    Returns:
+        Boolean array, True for each polyline that is valid
+    """
+    reasons = classify_polylines(polylines, min_polyline_points, max_polyline_points)
+    return reasons == POLYLINE_REASONS.index("valid")
+
+
+def classify_polylines_parallel(polylines, min_points, max_points, executor, max_workers):
+    """
+    Classify polylines with classify_polylines, split into one chunk per
+    worker process of executor. Trips are independent of each other, so the
+    chunks can be classified in parallel.
+
+    Returns:
+        int8 array with the index into POLYLINE_REASONS of each polyline
+    """
+    chunks = np.array_split(np.asarray(polylines, dtype=object), max_workers)
+    return np.concatenate(
+        list(
+            executor.map(
+                classify_polylines, chunks, repeat(min_points), repeat(max_points)
             )
+        )
+    )
+
 
-        result = validate_single_polyline(poly, min_points, max_points)
+def count_reasons(reasons, missing):
+    """
+    Count the reason codes of the trips with and without MISSING_DATA.
+
+    Returns:
+        Tuple of two int arrays (MISSING_DATA=True, MISSING_DATA=False),
+        indexed like POLYLINE_REASONS
+    """
+    return (
+        np.bincount(reasons[missing], minlength=len(POLYLINE_REASONS)),
+        np.bincount(reasons[~missing], minlength=len(POLYLINE_REASONS)),
+    )
+
+
+def count_invalid_trips_in_chunks(chunks, min_points, max_points, max_workers=None):
+    """
+    Count invalid trips by category over an iterable of DataFrame chunks.
 
-        if miss:
-            counts_missing[result["reason"]] += 1
-        else:
-            counts_valid_flag[result["reason"]] += 1
+    Each chunk is classified with the worker pool and its reason counts are
+    added up. Progress is printed after each chunk.
+
+    Args:
+        chunks: iterable of DataFrames with POLYLINE and MISSING_DATA columns
+
+    Returns:
+        Dictionary with counts by reason and missing_data status
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    valid = POLYLINE_REASONS.index("valid")
+
+    # Counters for trips with MISSING_DATA=True and MISSING_DATA=False
+    counts_missing = np.zeros(len(POLYLINE_REASONS), dtype=np.int64)
+    counts_valid_flag = np.zeros(len(POLYLINE_REASONS), dtype=np.int64)
+    rows_done = 0
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for chunk in chunks:
+            reasons = classify_polylines_parallel(
+                chunk["POLYLINE"], min_points, max_points, executor, max_workers
+            )
+            chunk_missing, chunk_valid_flag = count_reasons(
+                reasons, chunk["MISSING_DATA"].to_numpy(dtype=bool)
+            )
+            counts_missing += chunk_missing
+            counts_valid_flag += chunk_valid_flag
+
+            rows_done += len(chunk)
+            total_invalid = (
+                rows_done - counts_missing[valid] - counts_valid_flag[valid]
+            )
+            print(f"  Progress: {rows_done:,} rows - Invalid so far: {total_invalid:,}")
 
     return {
-        "missing_data_true": counts_missing,
-        "missing_data_false": counts_valid_flag,
+        "missing_data_true": dict(zip(POLYLINE_REASONS, counts_missing.tolist())),
+        "missing_data_false": dict(zip(POLYLINE_REASONS, counts_valid_flag.tolist())),
     }
 
 
+def count_invalid_trips(
+    df, min_points, max_points, chunksize=200_000, max_workers=None
+):
+    """
+    Count invalid trips by category.
+
+    Separates length-based invalidity from geographic invalidity. The
+    already loaded DataFrame is classified in slices of chunksize rows, with
+    the polylines of each slice split over parallel worker processes, and
+    the reasons are counted per MISSING_DATA flag with np.bincount.
+
+    Returns:
+        Dictionary with counts by reason and missing_data status
+    """
+    chunks = (df.iloc[i : i + chunksize] for i in range(0, len(df), chunksize))
+    return count_invalid_trips_in_chunks(chunks, min_points, max_points, max_workers)
+
+
+def count_invalid_trips_in_file(
+    filepath, min_points, max_points, chunksize=200_000, max_workers=None
+):
+    """
+    Count invalid trips by category straight from the CSV file.
+
+    Same counts as count_invalid_trips, for when nothing is loaded yet: only
+    POLYLINE and MISSING_DATA are read, in chunks of chunksize rows, so the
+    whole file never has to be in memory at once.
+
+    Returns:
+        Dictionary with counts by reason and missing_data status
+    """
+    # The pyarrow engine can't read in chunks, so this uses the C engine
+    chunks = pd.read_csv(
+        filepath,
+        usecols=["POLYLINE", "MISSING_DATA"],
+        dtype={"MISSING_DATA": "bool"},
+        chunksize=chunksize,
+    )
+    return count_invalid_trips_in_chunks(chunks, min_points, max_points, max_workers)
+
+
 def analyze_trip_statistics(df):
     """Calculate comprehensive trip length statistics."""
     valid_mask = (
@@ -248,10 +526,12 @@ def analyze_trip_statistics(df):
         & (df["MISSING_DATA"] == False)
     )
 
-    df["POLYLINE_LENGTH"] = 0
-    df.loc[valid_mask, "POLYLINE_LENGTH"] = df.loc[valid_mask, "POLYLINE"].apply(
-        lambda x: len(json.loads(x))
-    )
+    # Count the points from the "[" in each string instead of parsing the JSON,
+    # and build the whole column locally so it is assigned in one go
+    valid = valid_mask.to_numpy(dtype=bool)
+    polyline_lengths = np.zeros(len(df), dtype=np.int32)
+    polyline_lengths[valid] = count_polyline_points(df["POLYLINE"][valid]).to_numpy()
+    df["POLYLINE_LENGTH"] = polyline_lengths
 
     lengths = df[df["POLYLINE_LENGTH"] > 0]["POLYLINE_LENGTH"]
 
@@ -289,9 +569,14 @@ def analyze_bounds_impact(lengths, lower=8, upper=480):
     print(f"Lower bound: {lower} points ({lower * 15 / 60:.1f} min)")
     print(f"Upper bound: {upper} points ({upper * 15 / 60:.0f} min)")
 
-    too_short = (lengths < lower).sum()
-    too_long = (lengths > upper).sum()
-    valid = ((lengths >= lower) & (lengths <= upper)).sum()
+    # Sort the lengths once; every count below is then a binary search
+    sorted_lengths = np.sort(lengths.to_numpy())
+
+    too_short = np.searchsorted(sorted_lengths, lower, side="left")
+    too_long = len(sorted_lengths) - np.searchsorted(
+        sorted_lengths, upper, side="right"
+    )
+    valid = len(sorted_lengths) - too_short - too_long
 
     print(
         f"\nRemoved (too short): {too_short:,} ({too_short / len(lengths) * 100:.2f}%)"
@@ -302,7 +587,9 @@ def analyze_bounds_impact(lengths, lower=8, upper=480):
     # Compare thresholds
     print(f"\n=== Alternative Thresholds ===")
     for low, high in [(5, 360), (8, 480), (10, 400), (8, 200)]:
-        kept = ((lengths >= low) & (lengths <= high)).sum()
+        kept = np.searchsorted(sorted_lengths, high, side="right") - np.searchsorted(
+            sorted_lengths, low, side="left"
+        )
         print(
             f"[{low:3d}, {high:3d}]: {kept:,} ({kept / len(lengths) * 100:.1f}%) | {low * 15 / 60:.1f}-{high * 15 / 60:.0f} min"
         )
@@ -389,8 +676,13 @@ def visualize_distribution(lengths, stats, lower=8, upper=480):
         lengths, bins=50, density=True, color="lightblue", alpha=0.7, edgecolor="black"
     )
 
-    # Add KDE curve
-    kde = gaussian_kde(lengths)
+    # Add KDE curve, fitted on a random sample since evaluating it costs
+    # O(points * x values) and the smoothed curve looks the same
+    rng = np.random.default_rng(0)
+    kde_sample = rng.choice(
+        lengths.to_numpy(), size=min(KDE_SAMPLE_SIZE, len(lengths)), replace=False
+    )
+    kde = gaussian_kde(kde_sample)
     x_range = np.linspace(lengths.min(), lengths.max(), 100)
     axes[1, 0].plot(x_range, kde(x_range), color="red", linewidth=2, label="KDE")
     axes[1, 0].axvline(
@@ -435,7 +727,14 @@ def visualize_distribution(lengths, stats, lower=8, upper=480):
 
 
 def print_validation_summary(results):
-    """Print detailed summary of validation results."""
+    """
+    Print detailed summary of validation results.
+
+    Polylines that are too short or too long by their "[" count are rejected
+    before they are parsed, so a malformed polyline of such a length is counted
+    by its length. The Malformed counts are therefore lower bounds.
+    """
+    malformed_note = "(lower bound: polylines rejected by length are not parsed)"
     print("\n" + "=" * 70)
     print("VALIDATION SUMMARY")
     print("=" * 70)
@@ -448,7 +747,7 @@ def print_validation_summary(results):
     print(f"  Too Short (<{MIN_POLYLINE_POINTS} points): {missing_true['too_short']:,}")
     print(f"  Too Long (>{MAX_POLYLINE_POINTS} points): {missing_true['too_long']:,}")
     print(f"  Out of Bounds: {missing_true['out_of_bounds']:,}")
-    print(f"  Malformed: {missing_true['malformed']:,}")
+    print(f"  Malformed: {missing_true['malformed']:,} {malformed_note}")
     print(f"  Valid: {missing_true['valid']:,}")
     total_missing = sum(missing_true.values())
     print(f"  TOTAL: {total_missing:,}")
@@ -460,7 +759,7 @@ def print_validation_summary(results):
     )
     print(f"  Too Long (>{MAX_POLYLINE_POINTS} points): {missing_false['too_long']:,}")
     print(f"  Out of Bounds: {missing_false['out_of_bounds']:,}")
-    print(f"  Malformed: {missing_false['malformed']:,}")
+    print(f"  Malformed: {missing_false['malformed']:,} {malformed_note}")
     print(f"  Valid: {missing_false['valid']:,}")
     total_valid_flag = sum(missing_false.values())
     print(f"  TOTAL: {total_valid_flag:,}")
@@ -496,13 +795,15 @@ def print_validation_summary(results):
     )
     print("Data quality issues:")
     print(
-        f"    - Malformed: {total_malformed:,} ({total_malformed / total_trips * 100:.2f}%)"
+        f"    - Malformed: {total_malformed:,} ({total_malformed / total_trips * 100:.2f}%) "
+        f"{malformed_note}"
     )
     
 
 
 
 if __name__ == "__main__":
+    print(f"Calculated bounds: {PORTO_BOUNDS}")
     df = load_data()
 
     print("=" * 70)
@@ -528,6 +829,8 @@ if __name__ == "__main__":
     print("\n" + "=" * 70)
     print("STEP 5: Validate Polylines with Chosen Bounds")
     print("=" * 70)
+    # The polylines are already loaded, so classify the same DataFrame in
+    # slices instead of reading the CSV a second time
     start = time.time()
     results = count_invalid_trips(df, MIN_POLYLINE_POINTS, MAX_POLYLINE_POINTS)
 
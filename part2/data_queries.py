@@ -1,43 +1,197 @@
 import sqlite3
+import numpy as np
+import orjson
 import pandas as pd
-import ast
+import pyarrow.parquet as pq
 
 # Sandbox
-clean_file = "dataset/porto/porto_cleaned.csv"
+clean_file = "dataset/porto/porto_cleaned.parquet"
 db_file = "porto_sandbox.db"
 
-print("Loading CSV into SQLite...")
-df = pd.read_csv(clean_file)
+# Porto City Hall as (longitude, latitude), and the distance for question 6
+CITY_HALL = (-8.62911, 41.15794)
+CITY_HALL_RADIUS_M = 100
+EARTH_RADIUS_M = 6_371_000
 
-df["POLYLINE"] = df["POLYLINE"].apply(ast.literal_eval)
-df["num_points"] = df["POLYLINE"].apply(len)
-df["trip_duration_s"] = df["num_points"] * 15
-df["trip_duration_min"] = df["trip_duration_s"] / 60
-df["trip_duration_hour"] = df["trip_duration_min"] / 60
-df["POLYLINE"] = df["POLYLINE"].apply(str)
 
+def find_trips_near(trip_ids, polylines, point, radius_m):
+    """
+    Find the trips with at least one GPS point within radius_m meters of point.
+
+    All points of all polylines are parsed into one flat coordinate array. A
+    bounding box around point cheaply rules out almost every point, and the
+    haversine distance is only computed for the few that are left.
+
+    Args:
+        trip_ids: array of TRIP_IDs, one per polyline
+        polylines: polyline JSON strings like "[[-8.618643, 41.141412], ...]"
+        point: (longitude, latitude) to measure the distance from
+        radius_m: maximum distance in meters
+
+    Returns:
+        Sorted array of the matching TRIP_IDs
+    """
+    if len(polylines) == 0:
+        return np.array([], dtype=np.int64)
+
+    lon0, lat0 = point
+    coords = [np.array(orjson.loads(polyline), dtype=float) for polyline in polylines]
+    point_counts = np.array([len(c) for c in coords])
+    coords = np.concatenate(coords).reshape(-1, 2)
+    point_trip_ids = np.repeat(trip_ids, point_counts)
+
+    # The box is a little larger than the circle, so no point within
+    # radius_m is ruled out by it
+    lat_range = np.degrees(radius_m / EARTH_RADIUS_M) * 1.01
+    lon_range = lat_range / np.cos(np.radians(lat0))
+    candidates = (np.abs(coords[:, 0] - lon0) <= lon_range) & (
+        np.abs(coords[:, 1] - lat0) <= lat_range
+    )
+    lon, lat = np.radians(coords[candidates]).T
+    point_trip_ids = point_trip_ids[candidates]
+
+    # Haversine distance to point for the remaining candidates
+    a = (
+        np.sin((lat - np.radians(lat0)) / 2) ** 2
+        + np.cos(lat)
+        * np.cos(np.radians(lat0))
+        * np.sin((lon - np.radians(lon0)) / 2) ** 2
+    )
+    distance = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+    return np.unique(point_trip_ids[distance <= radius_m])
+
+
+print("Loading cleaned data into SQLite...")
 conn = sqlite3.connect(db_file)
 
-df.to_sql("porto", conn, index=False, if_exists="replace")
+# The sandbox database is rebuilt on every run, so skip the rollback journal
+# and fsyncs while loading
+conn.executescript(
+    """
+    PRAGMA journal_mode = OFF;
+    PRAGMA synchronous = OFF;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -524288;
+    """
+)
+
+# Create the table with explicit column types instead of letting to_sql guess
+# them. TRIP_ID is unique after cleaning, so as INTEGER PRIMARY KEY it becomes
+# the rowid itself and needs no separate index
+conn.executescript(
+    """
+    DROP TABLE IF EXISTS porto;
+    CREATE TABLE porto (
+        TRIP_ID INTEGER PRIMARY KEY,
+        CALL_TYPE TEXT NOT NULL,
+        ORIGIN_CALL INTEGER,
+        ORIGIN_STAND INTEGER,
+        TAXI_ID INTEGER NOT NULL,
+        TIMESTAMP INTEGER NOT NULL,
+        DAY_TYPE TEXT NOT NULL,
+        POLYLINE TEXT NOT NULL,
+        num_points INTEGER NOT NULL,
+        TRIP_DURATION INTEGER NOT NULL,
+        END_TIME INTEGER NOT NULL
+    );
+    DROP TABLE IF EXISTS city_hall_trips;
+    CREATE TABLE city_hall_trips (TRIP_ID INTEGER PRIMARY KEY);
+    DROP TABLE IF EXISTS hourly_trips;
+    CREATE TABLE hourly_trips (
+        hour_of_day INTEGER PRIMARY KEY,
+        trips INTEGER NOT NULL
+    );
+    """
+)
+
+# The cleaned data already has the point count of every trip in num_points
+# and its duration in seconds in TRIP_DURATION, so POLYLINE stays the original
+# string and is never parsed here. Minutes and hours are derived in the queries
+parquet_file = pq.ParquetFile(clean_file)
+columns = parquet_file.schema_arrow.names
+insert_sql = (
+    f"INSERT INTO porto ({', '.join(columns)}) "
+    f"VALUES ({', '.join('?' * len(columns))})"
+)
+
+# Stream the file in batches, so only one batch is held in memory at a time.
+# Every batch is inserted with the same prepared statement, all in a single
+# transaction. The columns are converted to plain Python lists once (NaN is
+# stored as NULL)
+hourly_counts = np.zeros(24, dtype=np.int64)
+with conn:
+    for batch in parquet_file.iter_batches(batch_size=200_000):
+        chunk = batch.to_pandas()
+
+        # Number of trips starting in each hour (UTC, like strftime with
+        # 'unixepoch'), so the time bands are summed from 24 counts instead of
+        # scanning every trip
+        hour_of_day = chunk["TIMESTAMP"].to_numpy(dtype=np.int64) // 3600 % 24
+        hourly_counts += np.bincount(hour_of_day, minlength=24)
+
+        conn.executemany(
+            insert_sql, zip(*(chunk[column].tolist() for column in columns))
+        )
+
+        # Question 6 needs every GPS point, which SQL cannot read from the
+        # polyline strings, so the trips passing City Hall are found here
+        # while the batch is in memory
+        near_city_hall = find_trips_near(
+            chunk["TRIP_ID"].to_numpy(),
+            chunk["POLYLINE"].to_numpy(),
+            CITY_HALL,
+            CITY_HALL_RADIUS_M,
+        )
+        conn.executemany(
+            "INSERT INTO city_hall_trips (TRIP_ID) VALUES (?)",
+            zip(near_city_hall.tolist()),
+        )
+
+    conn.executemany(
+        "INSERT INTO hourly_trips (hour_of_day, trips) VALUES (?, ?)",
+        enumerate(hourly_counts.tolist()),
+    )
+
+# Index after the bulk insert, so the indexes are built once. The per-taxi
+# index also holds the columns the per-taxi queries read, so they are answered
+# from the index alone without looking up the table rows
+conn.executescript(
+    """
+    CREATE INDEX idx_porto_taxi ON porto (TAXI_ID, num_points, TRIP_DURATION);
+    ANALYZE;
+    """
+)
+
+# Questions 3 and 5 both rank the taxis, so aggregate the trips per taxi once
+# into a small temporary table and rank from that
+conn.executescript(
+    """
+    CREATE TEMP TABLE taxi_agg AS
+    SELECT TAXI_ID, COUNT(*) AS trip_count, SUM(TRIP_DURATION) / 3600.0 AS Total_hours
+    FROM porto
+    GROUP BY TAXI_ID;
+    """
+)
 print("Data loaded into SQLite table 'porto'")
 
 queries = [
-    # Question 1 - How many taxis, trips, and total GPS points are there? TODO Missing GPS points (!)
-    """
-    SELECT COUNT(DISTINCT TAXI_ID) AS Taxis, COUNT(DISTINCT TRIP_ID) AS Trips
-    FROM porto; 
-    """,
+    # Question 1 - How many taxis, trips, and total GPS points are there?
     # Question 2 - What is the average number of trips per taxi?
+    # Both are answered from the same scan. TRIP_ID is the primary key, so
+    # COUNT(*) is the number of distinct trips, and the GPS points are the
+    # point counts summed from num_points
     """
-    SELECT COUNT(*) / COUNT(DISTINCT TAXI_ID) AS Average_Trips_Per_Taxi
-    FROM porto; 
+    SELECT COUNT(DISTINCT TAXI_ID) AS Taxis, COUNT(*) AS Trips,
+    SUM(num_points) AS GPS_Points,
+    COUNT(*) / COUNT(DISTINCT TAXI_ID) AS Average_Trips_Per_Taxi
+    FROM porto;
     """,
     # Question 3 - List the top 20 taxis with the most trips.
+    # Every cleaned trip has at least 8 points, so all trips are counted
     """
-    SELECT TAXI_ID, COUNT(*) AS trip_count
-    FROM porto
-    WHERE num_points >= 1
-    GROUP BY TAXI_ID
+    SELECT TAXI_ID, trip_count
+    FROM taxi_agg
     ORDER BY trip_count DESC
     LIMIT 20;
     """,
@@ -48,40 +202,30 @@ queries = [
     GROUP BY CALL_TYPE;
     """,
     # Question 4 - b. For each call type, compute the average trip duration and distance, and also report the share of trips starting in four time bands: 00–06, 06–12, 12–18, and 18–24
+    # All four bands are summed from the 24 hourly counts, with half-open
+    # intervals so every trip falls into exactly one band
     """
-    SELECT 
-    COUNT(*) AS Interval_00_06
-    FROM porto
-    WHERE CAST(strftime('%H', TIMESTAMP, 'unixepoch') AS INTEGER) BETWEEN 0 AND 6;
-
-    """,
-    """
-    SELECT 
-    COUNT(*) AS Interval_06_12
-    FROM porto
-    WHERE CAST(strftime('%H', TIMESTAMP, 'unixepoch') AS INTEGER) BETWEEN 6 AND 12;
-    """,
-    """
-    SELECT 
-    COUNT(*) AS Interval_12_18
-    FROM porto
-    WHERE CAST(strftime('%H', TIMESTAMP, 'unixepoch') AS INTEGER) BETWEEN 12 AND 18;
-    """,
-    """
-    SELECT 
-    COUNT(*) AS Interval_18_24
-    FROM porto
-    WHERE CAST(strftime('%H', TIMESTAMP, 'unixepoch') AS INTEGER) BETWEEN 18 AND 24;
+    SELECT
+    SUM(CASE WHEN hour_of_day < 6 THEN trips ELSE 0 END) AS Interval_00_06,
+    SUM(CASE WHEN hour_of_day >= 6 AND hour_of_day < 12 THEN trips ELSE 0 END) AS Interval_06_12,
+    SUM(CASE WHEN hour_of_day >= 12 AND hour_of_day < 18 THEN trips ELSE 0 END) AS Interval_12_18,
+    SUM(CASE WHEN hour_of_day >= 18 THEN trips ELSE 0 END) AS Interval_18_24
+    FROM hourly_trips;
     """,
     # Question 5 - Find the taxis with the most total hours driven as well as total distance driven. List them in order of total hours.
     """
-    SELECT TAXI_ID, SUM(trip_duration_hour) AS Total_hours
-    FROM porto
-    GROUP BY TAXI_ID
+    SELECT TAXI_ID, Total_hours
+    FROM taxi_agg
     ORDER BY Total_hours DESC
     LIMIT 20;
     """,  # Limit is only temporary
     # Question 6 - Find the trips that passed within 100 m of Porto City Hall. (longitude, latitude) = (-8.62911, 41.15794)
+    """
+    SELECT TRIP_ID, TAXI_ID, CALL_TYPE, TIMESTAMP
+    FROM porto
+    WHERE TRIP_ID IN (SELECT TRIP_ID FROM city_hall_trips)
+    ORDER BY TIMESTAMP;
+    """,
 ]
 
 for q in queries: